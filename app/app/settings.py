@@ -11,6 +11,10 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
 import os
+import sys
+from urllib.parse import urlsplit
+
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -39,7 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
-    'core',
+    'core.apps.CoreConfig',
     'user',
     'django_filters',
     'corsheaders'
@@ -47,6 +51,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'core.middleware.ProfilingMiddleware',
 ]
 
 # Add all domains you want
@@ -61,6 +67,10 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:8080",
 ]
 
+# Lets browser clients read and echo the primary pin, see REPLICA_PIN_HEADER
+CORS_ALLOW_HEADERS = list(default_headers) + ['x-db-primary']
+CORS_EXPOSE_HEADERS = ['x-db-primary']
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -95,6 +105,70 @@ DATABASES = {
     }
 }
 
+# Read replicas, as a comma separated list of host[:port][/name] entries
+# sharing the credentials of the primary, e.g. localhost:5433/app. The port
+# and name default to those of the primary. Safe requests read from them,
+# writes go to 'default'.
+REPLICA_DATABASES = []
+
+# Test cases only see their uncommitted data on the primary, so the test run
+# leaves REPLICA_DATABASES empty. Replica tests enable it with
+# override_settings.
+TESTING = sys.argv[1:2] == ['test']
+
+for index, replica in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    location = urlsplit(f'//{replica.strip()}')
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': location.hostname,
+        'NAME': location.path.lstrip('/') or DATABASES['default']['NAME'],
+        'OPTIONS': {'connect_timeout': 2},
+        'TEST': {'MIRROR': 'default'},
+    }
+    if location.port:
+        DATABASES[alias]['PORT'] = location.port
+    if not TESTING:
+        REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+# Seconds between two health checks of the same replica
+REPLICA_HEALTH_CHECK_INTERVAL = 5
+
+# Clients that just wrote read from the primary for this many seconds
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE = 'db_primary_until'
+# The pin expiry is also returned in this response header. Clients that do
+# not keep cookies, such as cross-origin apps, echo it back in their requests.
+REPLICA_PIN_HEADER = 'X-DB-Primary'
+
+
+# Bloom filter of user emails checked before querying for duplicates
+EMAIL_FILTER_CAPACITY = 100000
+EMAIL_FILTER_ERROR_RATE = 0.01
+EMAIL_FILTER_REBUILD_SECONDS = 300
+
+
+# Effective permission sets of users are cached in this cache alias.
+# Set CACHE_BACKEND and CACHE_LOCATION to a cache shared between processes,
+# e.g. django.core.cache.backends.memcached.MemcachedCache. The default
+# cache is local to each process, which does not see the invalidations of
+# the others, so permissions are then only cached for a few seconds.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+PERMISSION_CACHE = 'default'
+PERMISSION_CACHE_TIMEOUT = 60 * 60 if 'CACHE_BACKEND' in os.environ else 10
+
+AUTHENTICATION_BACKENDS = ['core.backends.CachedPermissionBackend']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -138,6 +212,21 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+
+# Request profiling, see the profile_requests management command
+PROFILING_DIR = '/vol/web/profiles'
+PROFILING_MAX_REPORTS = 100
+# Percentage of all requests to profile
+PROFILING_SAMPLE_PERCENT = 0
+# Staff users profile a request by adding ?profile to its URL
+PROFILING_QUERY_PARAM = 'profile'
+# Anyone can profile a request with an X-Profile header signed by
+# `manage.py profile_requests sign`, until it expires
+PROFILING_HEADER = 'HTTP_X_PROFILE'
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+# Number of project frames kept as the origin of each SQL query
+PROFILING_STACK_DEPTH = 5
+
 AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
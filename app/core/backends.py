@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+from core import db_router
+
+VERSION_KEY = 'perms:version'
+
+
+def get_cache():
+    return caches[settings.PERMISSION_CACHE]
+
+
+def get_version():
+    """Return the version shared by every cached permission set"""
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock rather than 1, so that losing the key never
+        # brings back entries cached under an earlier version
+        initial = time.time_ns()
+        cache.add(VERSION_KEY, initial, None)
+        version = cache.get(VERSION_KEY, initial)
+
+    return version
+
+
+def permission_cache_key(user_id, version=None):
+    if version is None:
+        version = get_version()
+    return f'perms:{version}:{user_id}'
+
+
+def invalidate_user(user_id):
+    """Drop the cached permission set of a single user"""
+    get_cache().delete(permission_cache_key(user_id))
+
+
+def invalidate_all():
+    """Expire every cached permission set by bumping the version"""
+    get_version()
+    try:
+        get_cache().incr(VERSION_KEY)
+    except ValueError:
+        # The key was evicted meanwhile, the next read starts a new version
+        pass
+
+
+class CachedPermissionBackend(ModelBackend):
+    """Model backend keeping effective permission sets in a shared cache"""
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            key = permission_cache_key(user_obj.pk)
+            perms = get_cache().get(key)
+            if perms is None:
+                # A lagging replica would cache permissions already revoked
+                with db_router.read_from_primary():
+                    perms = frozenset(super().get_all_permissions(user_obj))
+                get_cache().set(key, perms, settings.PERMISSION_CACHE_TIMEOUT)
+            user_obj._perm_cache = perms
+
+        return user_obj._perm_cache
+
+    def has_perm(self, user_obj, perm, obj=None):
+        return user_obj.is_active and \
+            perm in self.get_all_permissions(user_obj, obj=obj)
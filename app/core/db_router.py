@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.db.utils import DatabaseError
+
+PRIMARY_DB = 'default'
+
+_state = threading.local()
+_health = {}
+
+
+def use_replica(enabled):
+    """Allow or forbid reads from replicas for the current thread"""
+    _state.use_replica = enabled
+    _state.replica = None
+    _state.replicas_used = set()
+
+
+def replicas_allowed():
+    """Return True if reads of the current thread may go to a replica"""
+    return getattr(_state, 'use_replica', False)
+
+
+@contextmanager
+def read_from_primary():
+    """Send the reads of the block to the primary, e.g. before caching"""
+    allowed = replicas_allowed()
+    _state.use_replica = False
+    try:
+        yield
+    finally:
+        _state.use_replica = allowed
+
+
+def replicas_used():
+    """Return the replicas read from since the last use_replica call"""
+    return getattr(_state, 'replicas_used', set())
+
+
+def get_replicas():
+    """Return the aliases of the configured read replicas"""
+    return list(settings.REPLICA_DATABASES)
+
+
+def is_healthy(alias):
+    """Check that a replica accepts connections, caching the result"""
+    interval = settings.REPLICA_HEALTH_CHECK_INTERVAL
+    now = time.monotonic()
+    healthy, checked_at = _health.get(alias, (None, 0))
+    if healthy is not None and now - checked_at < interval:
+        return healthy
+
+    try:
+        connections[alias].ensure_connection()
+        healthy = True
+    except DatabaseError:
+        healthy = False
+    _health[alias] = (healthy, now)
+
+    return healthy
+
+
+def mark_unhealthy(alias):
+    """Take a replica out of rotation until its next health check"""
+    _health[alias] = (False, time.monotonic())
+
+
+def reset_health():
+    """Forget every cached health check result"""
+    _health.clear()
+
+
+class ReplicaRouter:
+    """Send writes to the primary and safe reads to a healthy replica"""
+
+    def db_for_read(self, model, **hints):
+        if not replicas_allowed():
+            return PRIMARY_DB
+        # Stick to one replica so a request sees a single point in time
+        alias = getattr(_state, 'replica', None)
+        if alias is None or not is_healthy(alias):
+            replicas = [a for a in get_replicas() if is_healthy(a)]
+            if not replicas:
+                return PRIMARY_DB
+            alias = _state.replica = random.choice(replicas)
+        replicas_used().add(alias)
+
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY_DB, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DB
@@ -0,0 +1,99 @@
+import io
+import pstats
+from collections import defaultdict
+
+from django.core.management import BaseCommand, CommandError
+
+from core import profiling
+
+
+class Command(BaseCommand):
+    """Django command to list, view and aggregate request profiles"""
+    help = 'List, view and aggregate stored request profiles'
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest='action', required=True)
+        actions.add_parser('list', help='List stored reports')
+        show = actions.add_parser('show', help='Show a single report')
+        show.add_argument('report_id')
+        show.add_argument('--limit', type=int, default=20)
+        aggregate = actions.add_parser(
+            'aggregate', help='Combine the reports of a path'
+        )
+        aggregate.add_argument('--path')
+        aggregate.add_argument('--limit', type=int, default=20)
+        actions.add_parser(
+            'sign', help='Print a value for the X-Profile header'
+        )
+
+    def handle(self, *args, **options):
+        getattr(self, f'handle_{options["action"]}')(**options)
+
+    def handle_list(self, **options):
+        for report in profiling.load_reports():
+            self.stdout.write(
+                f'{report["id"]}  {report["method"]} {report["path"]} '
+                f'{report["status"]}  {report["duration_ms"]:.1f}ms  '
+                f'{report["query_count"]} queries  ({report["trigger"]})'
+            )
+
+    def handle_show(self, report_id, limit, **options):
+        try:
+            report = profiling.load_report(report_id)
+        except FileNotFoundError:
+            raise CommandError(f'Unknown report {report_id}')
+
+        self.stdout.write(
+            f'{report["method"]} {report["path"]} {report["status"]} '
+            f'in {report["duration_ms"]:.1f}ms, {report["query_count"]} '
+            f'queries in {report["query_ms"]:.1f}ms'
+        )
+        for query in report['queries']:
+            self.stdout.write(
+                f'\n[{query["alias"]}] {query["duration_ms"]:.2f}ms '
+                f'{query["sql"]}'
+            )
+            for frame in query['origin']:
+                self.stdout.write(f'    {frame}')
+        self.write_stats([report_id], limit)
+
+    def handle_aggregate(self, path, limit, **options):
+        reports = [
+            r for r in profiling.load_reports()
+            if path is None or r['path'] == path
+        ]
+        if not reports:
+            raise CommandError('No matching reports')
+
+        durations = sorted(r['duration_ms'] for r in reports)
+        median = durations[len(durations) // 2]
+        self.stdout.write(
+            f'{len(reports)} requests, median {median:.1f}ms, '
+            f'max {durations[-1]:.1f}ms'
+        )
+
+        queries = defaultdict(lambda: [0, 0])
+        for report in reports:
+            for query in report['queries']:
+                queries[query['sql']][0] += 1
+                queries[query['sql']][1] += query['duration_ms']
+        by_time = sorted(queries.items(), key=lambda q: -q[1][1])
+        for sql, (count, total) in by_time[:limit]:
+            self.stdout.write(f'{count:>6} x {total:9.2f}ms  {sql}')
+        self.write_stats([r['id'] for r in reports], limit)
+
+    def handle_sign(self, **options):
+        self.stdout.write(profiling.make_token())
+
+    def write_stats(self, report_ids, limit):
+        """Print the slowest functions of the given reports combined"""
+        output = io.StringIO()
+        stats = pstats.Stats(stream=output)
+        for report_id in report_ids:
+            try:
+                stats.add(profiling.report_path(report_id, 'prof'))
+            except FileNotFoundError:
+                # Pruned since its report was loaded
+                pass
+        stats.sort_stats('cumulative').print_stats(limit)
+        self.stdout.write(output.getvalue())
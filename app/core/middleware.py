@@ -0,0 +1,125 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db.utils import InterfaceError, OperationalError
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from core import db_router, profiling
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Errors meaning a database is unreachable rather than a bad query
+REPLICA_ERRORS = (InterfaceError, OperationalError)
+
+
+class ReplicaRoutingMiddleware:
+    """Route safe requests to replicas, pinning recent writers to primary"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        db_router.use_replica(safe and not self.is_pinned(request))
+        try:
+            response = self.get_response(request)
+            if getattr(request, 'replica_failed', False):
+                # Safe requests can run again, this time on the primary
+                db_router.use_replica(False)
+                response = self.get_response(request)
+        finally:
+            db_router.use_replica(False)
+
+        if not safe:
+            self.pin(response)
+
+        return response
+
+    def process_exception(self, request, exception):
+        """Take replicas that broke mid-request out of rotation"""
+        used = db_router.replicas_used()
+        if not isinstance(exception, REPLICA_ERRORS) or not used:
+            return None
+        for alias in used:
+            db_router.mark_unhealthy(alias)
+        request.replica_failed = True
+
+        return None
+
+    def is_pinned(self, request):
+        """Return True if the client wrote within the pin window"""
+        pins = (
+            request.headers.get(settings.REPLICA_PIN_HEADER),
+            request.COOKIES.get(settings.REPLICA_PIN_COOKIE),
+        )
+        for pin in pins:
+            try:
+                if float(pin) > time.time():
+                    return True
+            except (TypeError, ValueError):
+                pass
+
+        return False
+
+    def pin(self, response):
+        """Pin the client to the primary for the read-your-writes window"""
+        seconds = settings.REPLICA_PIN_SECONDS
+        expires = str(int(time.time() + seconds))
+        response[settings.REPLICA_PIN_HEADER] = expires
+        response.set_cookie(
+            settings.REPLICA_PIN_COOKIE,
+            expires,
+            max_age=seconds,
+            httponly=True,
+            samesite='Lax'
+        )
+
+
+class ProfilingMiddleware:
+    """Profile requests asked for by staff, a signed header or sampling"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = self.get_trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        with profiling.RequestProfiler() as profiler:
+            response = self.get_response(request)
+        try:
+            profiling.save_report(request, response, trigger, profiler)
+        except OSError:
+            logger.exception('Could not save the profile of %s', request.path)
+
+        return response
+
+    def get_trigger(self, request):
+        """Return why the request should be profiled, or None"""
+        token = request.META.get(settings.PROFILING_HEADER)
+        if token and profiling.check_token(token):
+            return 'header'
+        if settings.PROFILING_QUERY_PARAM in request.GET and \
+                self.is_staff(request):
+            return 'staff'
+        if random.random() * 100 < settings.PROFILING_SAMPLE_PERCENT:
+            return 'sample'
+
+        return None
+
+    def is_staff(self, request):
+        """Check staff status from the session or the API token"""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+        try:
+            user_auth = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+
+        return user_auth is not None and user_auth[0].is_staff
@@ -0,0 +1,154 @@
+import cProfile
+import json
+import os
+import time
+import traceback
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+
+TOKEN_SALT = 'core.profiling'
+TOKEN_VALUE = 'profile'
+
+
+def make_token():
+    """Return a signed value enabling profiling when sent as a header"""
+    return signing.dumps(TOKEN_VALUE, salt=TOKEN_SALT)
+
+
+def check_token(token):
+    """Return True if the token was signed by us and has not expired"""
+    try:
+        value = signing.loads(
+            token,
+            salt=TOKEN_SALT,
+            max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+
+    return value == TOKEN_VALUE
+
+
+def query_origin():
+    """Return the project frames that led to the current query"""
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(settings.BASE_DIR) and
+        frame.filename != __file__
+    ]
+
+    return [
+        f'{os.path.relpath(frame.filename, settings.BASE_DIR)}:'
+        f'{frame.lineno} in {frame.name}'
+        for frame in frames[-settings.PROFILING_STACK_DEPTH:]
+    ]
+
+
+class RequestProfiler:
+    """Run code under cProfile while recording every SQL query"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.queries = []
+        self.duration = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'duration_ms': (time.perf_counter() - start) * 1000,
+                'origin': query_origin(),
+            })
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(
+                connection.execute_wrapper(self.record_query)
+            )
+        self._start = time.perf_counter()
+        self.profile.enable()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+        self.duration = time.perf_counter() - self._start
+        self._stack.close()
+
+
+def report_path(report_id, extension):
+    return os.path.join(settings.PROFILING_DIR, f'{report_id}.{extension}')
+
+
+def save_report(request, response, trigger, profiler):
+    """Write a report and its cProfile stats, then prune old reports"""
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    # Ids sort in the order the reports were saved, which pruning relies on
+    report_id = f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}'
+    report = {
+        'id': report_id,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'trigger': trigger,
+        'duration_ms': profiler.duration * 1000,
+        'query_count': len(profiler.queries),
+        'query_ms': sum(q['duration_ms'] for q in profiler.queries),
+        'queries': profiler.queries,
+    }
+    profiler.profile.dump_stats(report_path(report_id, 'prof'))
+    with open(report_path(report_id, 'json'), 'w') as report_file:
+        json.dump(report, report_file)
+    prune_reports()
+
+    return report_id
+
+
+def list_report_ids():
+    """Return the ids of the stored reports, oldest first"""
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+
+    return sorted(
+        name[:-len('.json')] for name in os.listdir(settings.PROFILING_DIR)
+        if name.endswith('.json')
+    )
+
+
+def load_report(report_id):
+    """Return a stored report, raising FileNotFoundError if unknown"""
+    with open(report_path(report_id, 'json')) as report_file:
+        return json.load(report_file)
+
+
+def load_reports():
+    """Return the stored reports, skipping those pruned while loading"""
+    reports = []
+    for report_id in list_report_ids():
+        try:
+            reports.append(load_report(report_id))
+        except FileNotFoundError:
+            pass
+
+    return reports
+
+
+def prune_reports():
+    """Delete the oldest reports beyond PROFILING_MAX_REPORTS"""
+    report_ids = list_report_ids()
+    excess = len(report_ids) - settings.PROFILING_MAX_REPORTS
+    for report_id in report_ids[:max(excess, 0)]:
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(report_path(report_id, extension))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core import backends
+
+User = get_user_model()
+CHANGES = ('post_add', 'post_remove', 'post_clear')
+
+
+# Invalidating before commit would let concurrent requests cache the old
+# permissions again until PERMISSION_CACHE_TIMEOUT.
+def invalidate_user(pk):
+    transaction.on_commit(lambda: backends.invalidate_user(pk))
+
+
+def invalidate_all():
+    transaction.on_commit(backends.invalidate_all)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    """Invalidate a saved user, is_active and is_superuser affect perms"""
+    invalidate_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_relation_changed(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """Invalidate the users whose groups or permissions changed"""
+    if action not in CHANGES:
+        return
+    if not reverse:
+        invalidate_user(instance.pk)
+    elif pk_set is None:
+        # Clearing from the group or permission side does not list users
+        invalidate_all()
+    else:
+        for pk in pk_set:
+            invalidate_user(pk)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, action, **kwargs):
+    """Invalidate every user when the permissions of a group change"""
+    if action in CHANGES:
+        invalidate_all()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def permission_source_deleted(sender, **kwargs):
+    """Invalidate every user when a group or permission disappears"""
+    invalidate_all()
@@ -0,0 +1,115 @@
+from unittest.mock import patch
+
+from django.db import transaction
+from django.test import TransactionTestCase
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+
+from core import backends, db_router
+
+
+class CachedPermissionBackendTests(TransactionTestCase):
+    """Invalidation happens on commit, hence TransactionTestCase"""
+
+    def setUp(self):
+        backends.get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@gmail.com',
+            password='testpass'
+        )
+        self.group = Group.objects.create(name='editors')
+        self.permission = Permission.objects.get(codename='change_user')
+
+    def fresh_user(self):
+        """Reload the user so only the shared cache is used"""
+        return get_user_model().objects.get(pk=self.user.pk)
+
+    def test_permissions_cached(self):
+        """Test that permission sets are read from the shared cache"""
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.fresh_user().has_perm('core.change_user'))
+
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('core.change_user'))
+            self.assertFalse(user.has_perm('core.delete_user'))
+
+    def test_user_permissions_invalidated(self):
+        """Test that changing user permissions invalidates the cache"""
+        self.assertFalse(self.fresh_user().has_perm('core.change_user'))
+
+        self.user.user_permissions.add(self.permission)
+
+        self.assertTrue(self.fresh_user().has_perm('core.change_user'))
+
+    def test_groups_invalidated(self):
+        """Test that joining or leaving a group invalidates the cache"""
+        self.group.permissions.add(self.permission)
+        self.assertFalse(self.fresh_user().has_perm('core.change_user'))
+
+        self.user.groups.add(self.group)
+        self.assertTrue(self.fresh_user().has_perm('core.change_user'))
+
+        self.group.user_set.remove(self.user)
+        self.assertFalse(self.fresh_user().has_perm('core.change_user'))
+
+    def test_group_permissions_invalidated(self):
+        """Test that editing group permissions invalidates the cache"""
+        self.user.groups.add(self.group)
+        self.assertFalse(self.fresh_user().has_perm('core.change_user'))
+
+        self.group.permissions.add(self.permission)
+        self.assertTrue(self.fresh_user().has_perm('core.change_user'))
+
+        self.group.delete()
+        self.assertFalse(self.fresh_user().has_perm('core.change_user'))
+
+    def test_inactive_user_has_no_permissions(self):
+        """Test that deactivating a user removes their permissions"""
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.fresh_user().has_perm('core.change_user'))
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertFalse(self.fresh_user().has_perm('core.change_user'))
+
+    def test_cache_filled_from_primary(self):
+        """Test that cache misses never read permissions from a replica"""
+        allowed = []
+
+        def get_all_permissions(backend, user_obj, obj=None):
+            allowed.append(db_router.replicas_allowed())
+            return set()
+
+        db_router.use_replica(True)
+        self.addCleanup(db_router.use_replica, False)
+        with patch.object(ModelBackend, 'get_all_permissions',
+                          get_all_permissions):
+            self.user.has_perm('core.change_user')
+
+        self.assertEqual(allowed, [False])
+        self.assertTrue(db_router.replicas_allowed())
+
+    def test_invalidated_on_commit(self):
+        """Test that entries are only dropped once the change commits"""
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.fresh_user().has_perm('core.change_user'))
+        key = backends.permission_cache_key(self.user.pk)
+
+        with transaction.atomic():
+            self.user.user_permissions.remove(self.permission)
+            self.assertIsNotNone(backends.get_cache().get(key))
+
+        self.assertIsNone(backends.get_cache().get(key))
+
+    def test_lost_version_starts_new_version(self):
+        """Test that losing the version key never revives old entries"""
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.fresh_user().has_perm('core.change_user'))
+        key = backends.permission_cache_key(self.user.pk)
+
+        backends.get_cache().delete(backends.VERSION_KEY)
+
+        self.assertNotEqual(backends.permission_cache_key(self.user.pk), key)
@@ -1,8 +1,12 @@
+from io import StringIO
 from unittest.mock import patch
 
-from django.core.management import call_command
+from django.core.management import call_command, CommandError
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, override_settings
+
+from core import profiling
+from .test_profiling import TEST_PROFILING_DIR, empty_profiling_dir
 
 
 class CommandTests(TestCase):
@@ -21,3 +25,55 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+
+@override_settings(
+    PROFILING_DIR=TEST_PROFILING_DIR,
+    PROFILING_SAMPLE_PERCENT=100
+)
+class ProfileRequestsCommandTests(TestCase):
+
+    def setUp(self):
+        empty_profiling_dir(self)
+        self.client.get('/api/user/me/')
+        self.report_id = profiling.list_report_ids()[0]
+
+    def call(self, *args):
+        out = StringIO()
+        call_command('profile_requests', *args, stdout=out)
+        return out.getvalue()
+
+    def test_list_reports(self):
+        """Test listing the stored profiling reports"""
+        self.assertIn(self.report_id, self.call('list'))
+
+    def test_pruned_reports_skipped(self):
+        """Test that reports pruned while listing are skipped"""
+        report_ids = [self.report_id, '0-pruned']
+        with patch('core.profiling.list_report_ids', return_value=report_ids):
+            self.assertIn(self.report_id, self.call('list'))
+            self.assertIn('1 requests', self.call('aggregate'))
+
+    def test_show_report(self):
+        """Test showing a single profiling report"""
+        out = self.call('show', self.report_id)
+
+        self.assertIn('/api/user/me/', out)
+        self.assertIn('function calls', out)
+
+    def test_show_unknown_report(self):
+        """Test showing a report that does not exist fails"""
+        with self.assertRaises(CommandError):
+            self.call('show', 'unknown')
+
+    def test_aggregate_reports(self):
+        """Test aggregating the reports of a path"""
+        out = self.call('aggregate', '--path', '/api/user/me/')
+
+        self.assertIn('1 requests', out)
+
+    def test_sign(self):
+        """Test that signed header values are accepted"""
+        token = self.call('sign').strip()
+
+        self.assertTrue(profiling.check_token(token))
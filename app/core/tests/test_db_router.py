@@ -0,0 +1,267 @@
+import time
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.utils import OperationalError, ProgrammingError
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TransactionTestCase, RequestFactory, \
+    override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import db_router
+from core.middleware import ReplicaRoutingMiddleware
+
+ME_URL = reverse('user:me')
+TOKEN_URL = reverse('user:token')
+
+
+def replica_failing_view(request):
+    """Fail like an unreachable replica, then succeed on the primary"""
+    if db_router.replicas_allowed():
+        db_router.ReplicaRouter().db_for_read(None)
+        raise OperationalError('replica unreachable')
+    return HttpResponse('primary')
+
+
+urlpatterns = [
+    path('replica-failing/', replica_failing_view),
+]
+
+
+@override_settings(REPLICA_DATABASES=['replica_0', 'replica_1'])
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = db_router.ReplicaRouter()
+        db_router.reset_health()
+
+    def tearDown(self):
+        db_router.use_replica(False)
+        db_router.reset_health()
+
+    def test_writes_go_to_primary(self):
+        """Test that writes always use the primary database"""
+        db_router.use_replica(True)
+
+        self.assertEqual(self.router.db_for_write(None), 'default')
+
+    def test_reads_outside_request_use_primary(self):
+        """Test that reads use the primary unless replicas are allowed"""
+        db_router.use_replica(False)
+
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+    @patch('core.db_router.is_healthy', return_value=True)
+    def test_reads_use_replica(self, ih):
+        """Test that allowed reads go to a replica"""
+        db_router.use_replica(True)
+
+        alias = self.router.db_for_read(None)
+
+        self.assertIn(alias, ['replica_0', 'replica_1'])
+
+    @patch('core.db_router.is_healthy')
+    def test_reads_skip_unhealthy_replica(self, ih):
+        """Test that unhealthy replicas are not read from"""
+        ih.side_effect = lambda alias: alias == 'replica_1'
+        db_router.use_replica(True)
+
+        self.assertEqual(self.router.db_for_read(None), 'replica_1')
+
+    @patch('core.db_router.is_healthy', return_value=False)
+    def test_reads_fail_over_to_primary(self, ih):
+        """Test that reads use the primary when no replica is healthy"""
+        db_router.use_replica(True)
+
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+    @patch('core.db_router.is_healthy', return_value=True)
+    def test_reads_stick_to_one_replica(self, ih):
+        """Test that all reads of a request use the same replica"""
+        db_router.use_replica(True)
+        aliases = {self.router.db_for_read(None) for _ in range(20)}
+
+        self.assertEqual(len(aliases), 1)
+
+    @patch('core.db_router.is_healthy')
+    def test_unhealthy_replica_replaced(self, ih):
+        """Test that reads move on when the chosen replica fails"""
+        ih.return_value = True
+        db_router.use_replica(True)
+        alias = self.router.db_for_read(None)
+
+        ih.side_effect = lambda a: a != alias
+        other = self.router.db_for_read(None)
+
+        self.assertNotEqual(other, alias)
+        self.assertIn(other, ['replica_0', 'replica_1'])
+
+    def test_health_check_is_cached(self):
+        """Test that a failing replica is checked once per interval"""
+        with patch('core.db_router.connections') as conns:
+            conns.__getitem__.return_value.ensure_connection.side_effect = \
+                OperationalError
+            self.assertFalse(db_router.is_healthy('replica_0'))
+            self.assertFalse(db_router.is_healthy('replica_0'))
+
+            self.assertEqual(conns.__getitem__.call_count, 1)
+
+
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.allowed = []
+        self.error = None
+
+        def view(request):
+            self.allowed.append(db_router.replicas_allowed())
+            if self.error is not None and db_router.replicas_allowed():
+                # Simulate a query failing on the replica it was routed to
+                db_router.ReplicaRouter().db_for_read(None)
+                self.middleware.process_exception(request, self.error)
+                return HttpResponse(status=500)
+            return HttpResponse()
+
+        self.middleware = ReplicaRoutingMiddleware(view)
+
+    def test_safe_request_reads_replica(self):
+        """Test that safe requests may read from replicas"""
+        res = self.middleware(self.factory.get('/'))
+
+        self.assertEqual(self.allowed, [True])
+        self.assertNotIn('db_primary_until', res.cookies)
+        self.assertFalse(res.has_header('X-DB-Primary'))
+        self.assertFalse(db_router.replicas_allowed())
+
+    def test_unsafe_request_pins_primary(self):
+        """Test that writes use the primary and pin the client to it"""
+        res = self.middleware(self.factory.post('/'))
+
+        self.assertEqual(self.allowed, [False])
+        self.assertIn('db_primary_until', res.cookies)
+        self.assertGreater(float(res['X-DB-Primary']), time.time())
+
+    def test_pinned_client_reads_primary(self):
+        """Test that a client that just wrote reads from the primary"""
+        request = self.factory.get('/')
+        request.COOKIES['db_primary_until'] = str(time.time() + 10)
+        self.middleware(request)
+
+        self.assertEqual(self.allowed, [False])
+
+    def test_expired_pin_reads_replica(self):
+        """Test that an expired pin no longer forces primary reads"""
+        request = self.factory.get('/')
+        request.COOKIES['db_primary_until'] = str(time.time() - 1)
+        self.middleware(request)
+
+        self.assertEqual(self.allowed, [True])
+
+    def test_echoed_header_reads_primary(self):
+        """Test that clients without cookies can echo the pin header"""
+        pin = str(time.time() + 10)
+        self.middleware(self.factory.get('/', HTTP_X_DB_PRIMARY=pin))
+
+        self.assertEqual(self.allowed, [False])
+
+    @override_settings(REPLICA_DATABASES=['replica_0'])
+    @patch('core.db_router.is_healthy', return_value=True)
+    def test_replica_error_fails_over(self, ih):
+        """Test that a request retries on the primary if a replica fails"""
+        self.error = OperationalError()
+
+        with patch('core.db_router.mark_unhealthy') as mu:
+            res = self.middleware(self.factory.get('/'))
+
+        mu.assert_called_once_with('replica_0')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.allowed, [True, False])
+
+    @override_settings(REPLICA_DATABASES=['replica_0'])
+    @patch('core.db_router.is_healthy', return_value=True)
+    def test_query_error_not_retried(self, ih):
+        """Test that errors in the query itself do not fail over"""
+        self.error = ProgrammingError()
+
+        with patch('core.db_router.mark_unhealthy') as mu:
+            res = self.middleware(self.factory.get('/'))
+
+        mu.assert_not_called()
+        self.assertEqual(res.status_code, 500)
+        self.assertEqual(self.allowed, [True])
+
+
+@override_settings(ROOT_URLCONF=__name__, REPLICA_DATABASES=['replica_0'])
+class ReplicaFailoverTests(SimpleTestCase):
+
+    def setUp(self):
+        db_router.reset_health()
+        self.addCleanup(db_router.reset_health)
+
+    @patch('core.db_router.is_healthy', return_value=True)
+    def test_replica_error_retried_on_primary(self, ih):
+        """Test that Django's handler leads to a retry on the primary"""
+        self.client.raise_request_exception = False
+
+        with patch('core.db_router.mark_unhealthy') as mu:
+            res = self.client.get('/replica-failing/')
+
+        mu.assert_called_once_with('replica_0')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, b'primary')
+
+
+@skipUnless('replica_0' in settings.DATABASES, 'DB_REPLICA_HOSTS not set')
+@override_settings(REPLICA_DATABASES=['replica_0'])
+class ReplicaRoutingApiTests(TransactionTestCase):
+    """Test routing against a real replica alias mirroring the primary
+
+    Run with e.g. DB_REPLICA_HOSTS=db/app. Other tests keep reading from the
+    primary. The replica only sees committed data, hence
+    TransactionTestCase.
+    """
+    # Naming replica_0 here would fail the run when it is not configured
+    databases = '__all__'
+
+    def setUp(self):
+        db_router.reset_health()
+        self.payload = {'email': 'test@gmail.com', 'password': 'testpass'}
+        user = get_user_model().objects.create_user(**self.payload)
+        self.token = Token.objects.create(user=user)
+        self.client = APIClient()
+
+    def get_me(self, **extra):
+        """Return the response and the queries run on each database"""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica_0']) as replica:
+            res = self.client.get(ME_URL, **extra)
+
+        return res, len(primary), len(replica)
+
+    def test_get_reads_from_replica(self):
+        """Test that a safe request only queries the replica"""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        res, primary, replica = self.get_me()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_get_after_write_reads_from_primary(self):
+        """Test that a client reads its own writes from the primary"""
+        res = self.client.post(TOKEN_URL, self.payload)
+        token = res.data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        res, primary, replica = self.get_me()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import profiling
+
+ME_URL = reverse('user:me')
+TEST_PROFILING_DIR = os.path.join(
+    tempfile.gettempdir(), f'core-test-profiles-{os.getpid()}'
+)
+
+
+def empty_profiling_dir(test):
+    """Start a test with no reports and remove its reports afterwards"""
+    shutil.rmtree(TEST_PROFILING_DIR, ignore_errors=True)
+    test.addCleanup(shutil.rmtree, TEST_PROFILING_DIR, ignore_errors=True)
+
+
+@override_settings(PROFILING_DIR=TEST_PROFILING_DIR)
+class ProfilingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        empty_profiling_dir(self)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@gmail.com',
+            password='testpass'
+        )
+
+    def test_not_profiled_by_default(self):
+        """Test that requests are not profiled without a trigger"""
+        self.client.force_authenticate(user=self.user)
+        self.client.get(ME_URL)
+
+        self.assertEqual(profiling.list_report_ids(), [])
+
+    def test_profiled_with_signed_header(self):
+        """Test that a signed header profiles the request"""
+        self.client.force_authenticate(user=self.user)
+        self.client.get(ME_URL, HTTP_X_PROFILE=profiling.make_token())
+
+        report_ids = profiling.list_report_ids()
+        self.assertEqual(len(report_ids), 1)
+        report = profiling.load_report(report_ids[0])
+        self.assertEqual(report['path'], ME_URL)
+        self.assertEqual(report['trigger'], 'header')
+
+    def test_not_profiled_with_forged_header(self):
+        """Test that a header with a bad signature is ignored"""
+        self.client.get(ME_URL, HTTP_X_PROFILE='profile:forged')
+
+        self.assertEqual(profiling.list_report_ids(), [])
+
+    def test_profiled_by_staff_query_flag(self):
+        """Test that staff users profile requests with a query flag"""
+        self.user.is_staff = True
+        self.user.save()
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.client.get(ME_URL, {'profile': ''})
+
+        report = profiling.load_report(profiling.list_report_ids()[0])
+        self.assertEqual(report['trigger'], 'staff')
+        self.assertEqual(report['status'], 200)
+        self.assertGreater(report['query_count'], 0)
+        self.assertTrue(report['queries'][0]['origin'])
+
+    def test_query_flag_ignored_for_non_staff(self):
+        """Test that the query flag is ignored for regular users"""
+        self.client.force_login(self.user)
+        self.client.get(ME_URL, {'profile': ''})
+
+        self.assertEqual(profiling.list_report_ids(), [])
+
+    @override_settings(PROFILING_SAMPLE_PERCENT=100)
+    def test_profiled_by_sampling(self):
+        """Test that sampled requests are profiled"""
+        self.client.get(ME_URL)
+
+        report = profiling.load_report(profiling.list_report_ids()[0])
+        self.assertEqual(report['trigger'], 'sample')
+
+    @override_settings(PROFILING_SAMPLE_PERCENT=100, PROFILING_MAX_REPORTS=2)
+    def test_reports_are_bounded(self):
+        """Test that only the most recent reports are kept"""
+        saved = []
+        for _ in range(4):
+            self.client.get(ME_URL)
+            saved += set(profiling.list_report_ids()) - set(saved)
+
+        self.assertEqual(len(saved), 4)
+        self.assertEqual(profiling.list_report_ids(), saved[-2:])
+
+    @override_settings(PROFILING_SAMPLE_PERCENT=100)
+    def test_save_error_keeps_response(self):
+        """Test that failing to store a report does not fail the request"""
+        with patch('core.profiling.save_report', side_effect=OSError), \
+                self.assertLogs('core.middleware', 'ERROR'):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, 401)
@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.utils import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Probabilistic set answering 'maybe present' or 'surely absent'"""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        ))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        """Yield the bit positions of a value using double hashing"""
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+class EmailFilter:
+    """Bloom filter of user emails, rebuilt from the database periodically"""
+
+    def __init__(self):
+        self._filter = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def rebuild(self):
+        """Load every user email from the database into a new filter"""
+        users = get_user_model().objects
+        capacity = max(settings.EMAIL_FILTER_CAPACITY, users.count() * 2)
+        bloom = BloomFilter(capacity, settings.EMAIL_FILTER_ERROR_RATE)
+        for email in users.values_list('email', flat=True).iterator():
+            bloom.add(email)
+        self._filter = bloom
+        self._built_at = time.monotonic()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except DatabaseError:
+            logger.exception('Could not rebuild the email filter')
+        finally:
+            self._rebuilding = False
+            connections.close_all()
+
+    def _current(self):
+        """Return the filter, refreshing it in the background when stale
+
+        Only the first check of a process waits for the filter to be built,
+        later checks keep using the previous filter during a rebuild.
+        """
+        if self._filter is None:
+            with self._lock:
+                if self._filter is None:
+                    self.rebuild()
+        elif time.monotonic() - self._built_at > \
+                settings.EMAIL_FILTER_REBUILD_SECONDS:
+            with self._lock:
+                start = not self._rebuilding
+                self._rebuilding = True
+            if start:
+                threading.Thread(
+                    target=self._rebuild_in_background, daemon=True
+                ).start()
+
+        return self._filter
+
+    def might_contain(self, email):
+        """Return False only if no user has this normalized email"""
+        return email in self._current()
+
+    def add(self, email):
+        """Record a new email without waiting for the next rebuild"""
+        if self._filter is not None:
+            self._filter.add(email)
+
+    def reset(self):
+        """Drop the filter so that the next check rebuilds it"""
+        self._filter = None
+
+
+email_filter = EmailFilter()
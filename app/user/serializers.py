@@ -1,8 +1,57 @@
+from contextlib import contextmanager, nullcontext
+
 from django.contrib.auth import get_user_model, authenticate
+from django.db import IntegrityError, transaction
 from django.utils.translation import ugettext_lazy as _
 
 from rest_framework import serializers
 
+from .email_filter import email_filter
+
+
+def unique_email_message():
+    """Return the message UniqueValidator would use for a taken email"""
+    field = get_user_model()._meta.get_field('email')
+
+    return field.error_messages['unique'] % {
+        'model_name': field.model._meta.verbose_name,
+        'field_label': field.verbose_name
+    }
+
+
+def is_unique_email_violation(exc):
+    """Tell a violation of the unique email constraint from other errors"""
+    table = get_user_model()._meta.db_table
+    diag = getattr(exc.__cause__, 'diag', None)
+    if diag is not None:
+        # psycopg2 reports the name of the violated constraint
+        return diag.constraint_name == f'{table}_email_key'
+
+    # SQLite has no constraint names and only reports the column
+    return str(exc) == f'UNIQUE constraint failed: {table}.email'
+
+
+@contextmanager
+def unique_email():
+    """Turn a violation of the unique email constraint into a 400
+
+    A savepoint is only needed to recover the surrounding transaction, in
+    autocommit mode the failed statement leaves nothing to roll back.
+    """
+    if transaction.get_connection().in_atomic_block:
+        savepoint = transaction.atomic()
+    else:
+        savepoint = nullcontext()
+    try:
+        with savepoint:
+            yield
+    except IntegrityError as exc:
+        if not is_unique_email_violation(exc):
+            raise
+        raise serializers.ValidationError(
+            {'email': [unique_email_message()]}, code='unique'
+        )
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializers for the users object"""
@@ -10,20 +59,44 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
         fields = ('email', 'password', 'name')
-        extra_kwargs = {'password': {'write_only': True, 'min_length': 5}}
+        extra_kwargs = {
+            'password': {'write_only': True, 'min_length': 5},
+            # Uniqueness is checked by validate_email and the database
+            'email': {'validators': []}
+        }
+
+    def validate_email(self, value):
+        """Reject taken emails, querying only on a Bloom filter match"""
+        email = get_user_model().objects.normalize_email(value)
+        if email_filter.might_contain(email):
+            users = get_user_model().objects.filter(email=email)
+            if self.instance is not None:
+                users = users.exclude(pk=self.instance.pk)
+            if users.exists():
+                raise serializers.ValidationError(
+                    unique_email_message(), code='unique'
+                )
+
+        return email
 
     def create(self, validated_data):
         """Create a new user with encrypted password and return it"""
-        return get_user_model().objects.create_user(**validated_data)
+        with unique_email():
+            user = get_user_model().objects.create_user(**validated_data)
+        email_filter.add(user.email)
+
+        return user
 
     def update(self, instance, validated_data):
         """Update a user, setting the password correctly and return it"""
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
+        with unique_email():
+            user = super().update(instance, validated_data)
 
-        if password:
-            user.set_password(password)
-            user.save()
+            if password:
+                user.set_password(password)
+                user.save()
+        email_filter.add(user.email)
 
         return user
 
@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from user.email_filter import BloomFilter, EmailFilter
+
+
+class BloomFilterTests(TestCase):
+
+    def test_added_values_are_found(self):
+        """Test that every added value is reported as present"""
+        bloom = BloomFilter(capacity=100, error_rate=0.01)
+        emails = [f'user{i}@gmail.com' for i in range(100)]
+        for email in emails:
+            bloom.add(email)
+
+        self.assertTrue(all(email in bloom for email in emails))
+
+    def test_false_positive_rate(self):
+        """Test that absent values are rarely reported as present"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'user{i}@gmail.com')
+
+        hits = sum(f'other{i}@gmail.com' in bloom for i in range(1000))
+
+        self.assertLess(hits, 30)
+
+
+class EmailFilterTests(TestCase):
+
+    def test_filter_built_from_users(self):
+        """Test that the filter contains the emails of existing users"""
+        get_user_model().objects.create_user('test@gmail.com', 'testpass')
+        email_filter = EmailFilter()
+
+        self.assertTrue(email_filter.might_contain('test@gmail.com'))
+        self.assertFalse(email_filter.might_contain('other@gmail.com'))
+
+    def test_added_email_found_before_rebuild(self):
+        """Test that added emails are found without a rebuild"""
+        email_filter = EmailFilter()
+        email_filter.rebuild()
+        email_filter.add('test@gmail.com')
+
+        with self.assertNumQueries(0):
+            self.assertTrue(email_filter.might_contain('test@gmail.com'))
+
+    def test_stale_filter_rebuilt_in_background(self):
+        """Test that a stale filter is still used while it is rebuilt"""
+        email_filter = EmailFilter()
+        email_filter.rebuild()
+        email_filter.add('test@gmail.com')
+        email_filter._built_at -= 3600
+
+        with patch('user.email_filter.threading.Thread') as thread, \
+                self.assertNumQueries(0):
+            self.assertTrue(email_filter.might_contain('test@gmail.com'))
+            self.assertTrue(email_filter.might_contain('test@gmail.com'))
+
+        thread.return_value.start.assert_called_once()
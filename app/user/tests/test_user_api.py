@@ -1,10 +1,15 @@
-from django.test import TestCase
+from unittest.mock import patch
+
+from django.db import IntegrityError
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from user.email_filter import email_filter
+
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
@@ -19,6 +24,7 @@ class PublicUserApiTests(TestCase):
     """Test the users API public"""
 
     def setUp(self):
+        email_filter.reset()
         self.client = APIClient()
 
     def test_create_valid_user_success(self):
@@ -49,6 +55,39 @@ class PublicUserApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    @patch('user.serializers.email_filter.might_contain', return_value=False)
+    def test_user_exists_missed_by_email_filter(self, mc):
+        """Test the insert rejects a taken email the filter did not see"""
+        payload = {
+            'email': 'test@gmail.com',
+            'password': 'testpass',
+            'name': 'Test'
+        }
+        create_user(**payload)
+
+        res = self.client.post(CREATE_USER_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data['email'], ['user with this email already exists.']
+        )
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    @patch('core.models.UserManager.create_user')
+    def test_other_integrity_error_not_hidden(self, cu):
+        """Test that unrelated integrity errors are not reported as 400"""
+        cu.side_effect = IntegrityError(
+            'NOT NULL constraint failed: core_user.email'
+        )
+        payload = {
+            'email': 'test@gmail.com',
+            'password': 'testpass',
+            'name': 'Test'
+        }
+
+        with self.assertRaises(IntegrityError):
+            self.client.post(CREATE_USER_URL, payload)
+
     def test_password_too_short(self):
         """Test that the password must be more than 5 characters"""
         payload = {
@@ -116,6 +155,37 @@ class PublicUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class SignupQueryTests(TransactionTestCase):
+    """Test signup outside a transaction, as in production"""
+
+    def setUp(self):
+        email_filter.reset()
+        self.client = APIClient()
+        self.payload = {
+            'email': 'test@gmail.com',
+            'password': 'testpass',
+            'name': 'Test'
+        }
+
+    @patch('user.serializers.email_filter.might_contain', return_value=False)
+    def test_signup_single_query(self, mc):
+        """Test that a new email is created with a single INSERT"""
+        with self.assertNumQueries(1):
+            res = self.client.post(CREATE_USER_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    @patch('user.serializers.email_filter.might_contain', return_value=False)
+    def test_user_exists_without_transaction(self, mc):
+        """Test a taken email is rejected by the insert in autocommit mode"""
+        create_user(**self.payload)
+
+        res = self.client.post(CREATE_USER_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+
 class PrivateUserApiTests(TestCase):
     """Test API requests that require authentication"""
 